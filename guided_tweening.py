@@ -10,12 +10,11 @@ bl_info = {
 
 import bpy
 import gpu
-from gpu_extras.batch import batch_for_shader
-from bpy_extras import view3d_utils
-from mathutils import Vector
+import numpy as np
 from bpy.props import (
     BoolProperty, FloatVectorProperty, IntProperty, FloatProperty, EnumProperty)
 import traceback, time, math
+from bisect import bisect_left
 
 # -------------------------
 # Globals / State
@@ -23,7 +22,10 @@ import traceback, time, math
 _draw_handle = None
 _timer_keep = False
 
-_guide_strokes_world = []
+# guide strokes in world space: all points in one (N,3) float32 array,
+# stroke i is _guide_points_xyz[_guide_stroke_offsets[i]:_guide_stroke_offsets[i+1]]
+_guide_points_xyz = np.empty((0, 3), dtype='f4')
+_guide_stroke_offsets = np.zeros(1, dtype='i4')
 _guide_index = 0
 _monitored_frame = None
 _last_current_frame_count = 0
@@ -38,6 +40,28 @@ _debounce_seconds = 0.35
 # integrity re-check counter
 _advances_since_check = 0
 
+# watcher polling: slow while idle, fast after a grease pencil update or while a commit is pending
+_dirty = False
+_IDLE_INTERVAL = 0.5
+_ACTIVE_INTERVAL = 0.05
+_GP_ID_TYPES = ("GREASEPENCIL", "GREASEPENCIL_V3")
+
+# arrow segment indices keyed by (seg_count, density, margin), small LRU
+_arrow_index_cache = {}
+_ARROW_INDEX_CACHE_SIZE = 8
+
+# sorted frame lookup for the active layer, rebuilt when the layer or its frame count changes
+# and dropped on every grease pencil depsgraph update (keyframes moved in the dope sheet)
+_frame_index = {"layer_id": None, "count": -1, "sorted_nums": [], "by_num": {}}
+
+# cached guide batches per region (as_pointer), rebuilt only when the view or guide settings change:
+# view_key -> projected stroke + path batch; key (guide settings) -> marker/arrow batches
+_draw_cache = {}
+
+def new_draw_cache_entry():
+    return {"view_key": None, "pts2d": None, "path_batch": None,
+            "key": None, "marker_batch": (None, None), "arrow_batch": None}
+
 # shader
 _SHADER = gpu.shader.from_builtin("UNIFORM_COLOR")
 
@@ -111,255 +135,347 @@ def get_active_gp(context):
         return o
     return None
 
+def tag_view3d_redraw():
+    # only called on ticks that changed state, so a plain walk over the areas is cheap enough
+    for w in bpy.context.window_manager.windows:
+        for a in w.screen.areas:
+            if a.type == "VIEW_3D": a.tag_redraw()
+
+def get_frame_index(layer):
+    layer_id = layer.as_pointer()
+    count = len(layer.frames)
+    if _frame_index["layer_id"] != layer_id or _frame_index["count"] != count:
+        by_num = {fr.frame_number: fr for fr in layer.frames}
+        _frame_index.update(layer_id=layer_id, count=count, sorted_nums=sorted(by_num), by_num=by_num)
+    return _frame_index
+
+def invalidate_frame_index():
+    _frame_index["layer_id"] = None
+
 def find_nearest_previous_frame(layer, current_frame_num):
-    nearest = None
-    best = float("inf")
-    for fr in layer.frames:
-        if fr.frame_number < current_frame_num and getattr(fr,"drawing",None):
-            if not fr.drawing.strokes:
-                continue
-            d = current_frame_num - fr.frame_number
-            if d < best:
-                nearest = fr; best = d
-    return nearest
+    index = get_frame_index(layer)
+    nums = index["sorted_nums"]
+    # walk back from the predecessor, skipping empty frames
+    for i in range(bisect_left(nums, current_frame_num)-1, -1, -1):
+        fr = index["by_num"][nums[i]]
+        if getattr(fr,"drawing",None) and fr.drawing.strokes:
+            return fr
+    return None
+
+def _no_strokes():
+    return np.empty((0, 3), dtype='f4'), np.zeros(1, dtype='i4')
 
 def get_previous_frame_strokes_world(context):
+    """Return (points, offsets): all world-space points as one (N,3) float32 array and
+    per-stroke start offsets (S+1,) so stroke i is points[offsets[i]:offsets[i+1]]."""
     obj = get_active_gp(context)
-    if not obj: return []
-    if not obj.data.layers or obj.data.layers.active is None: return []
+    if not obj: return _no_strokes()
+    if not obj.data.layers or obj.data.layers.active is None: return _no_strokes()
     layer = obj.data.layers.active
     current = context.scene.frame_current
     nearest = find_nearest_previous_frame(layer, current)
-    if not nearest: return []
-    mat = obj.matrix_world
-    strokes = []
+    if not nearest: return _no_strokes()
+    mat = np.asarray(obj.matrix_world, dtype='f4')
+    drawing = nearest.drawing
+    # GP v3 stroke.points is a python slice without foreach_get: read the drawing's
+    # point attribute and curve offsets in one call each instead
     try:
-        for stroke in nearest.drawing.strokes:
-            pts = [mat @ Vector(p.position) for p in stroke.points]
-            if len(pts) >= 1:
-                strokes.append(pts)
+        position = drawing.attributes["position"].data
+        buf = np.empty(len(position)*3, dtype='f4')
+        position.foreach_get("vector", buf)
+        curve_offsets = drawing.curve_offsets
+        offsets = np.empty(len(curve_offsets), dtype='i4')
+        curve_offsets.foreach_get("value", offsets)
     except Exception:
         debug("copy error:\n"+traceback.format_exc())
-        return []
-    return strokes
+        return _no_strokes()
+    if len(offsets) < 2 or not len(buf): return _no_strokes()
+    pts = buf.reshape(-1, 3) @ mat[:3, :3].T + mat[:3, 3]
+    return pts, offsets
 
-def get_frame_stroke_count(context, frame_number):
+def guide_stroke_count():
+    return len(_guide_stroke_offsets)-1
+
+def get_frame_drawing(context, frame_number):
+    """Return the active layer's drawing on frame (or None)."""
     obj = get_active_gp(context)
-    if not obj: return 0
-    if not obj.data.layers or obj.data.layers.active is None: return 0
+    if not obj: return None
     layer = obj.data.layers.active
-    fr = None
-    if getattr(layer,"active_frame",None) and layer.active_frame.frame_number==frame_number:
-        fr = layer.active_frame
-    else:
-        for f in layer.frames:
-            if f.frame_number == frame_number:
-                fr = f; break
-    if not fr or not getattr(fr,"drawing",None): return 0
-    try:
-        return len(fr.drawing.strokes)
-    except Exception:
-        try: return sum(1 for _ in fr.drawing.strokes)
-        except Exception: return 0
+    if layer is None: return None
+    # GreasePencilLayer (v3) has no active_frame; the frame index is dropped on every GP update
+    fr = get_frame_index(layer)["by_num"].get(frame_number)
+    if fr is None: return None
+    return fr.drawing
+
+def get_frame_stroke_count(context, frame_number):
+    drawing = get_frame_drawing(context, frame_number)
+    if drawing is None: return 0
+    return len(drawing.strokes)
 
 def get_last_stroke_pointlen(context, frame_number):
     """Return number of points in the last stroke on frame (or 0)."""
-    try:
-        obj = get_active_gp(context)
-        if not obj: return 0
-        layer = obj.data.layers.active
-        if not layer: return 0
-        # find frame
-        fr = None
-        if getattr(layer, "active_frame", None) and layer.active_frame.frame_number == frame_number:
-            fr = layer.active_frame
-        else:
-            for f in layer.frames:
-                if f.frame_number == frame_number:
-                    fr = f; break
-        if not fr or not getattr(fr, "drawing", None):
-            return 0
-        if not fr.drawing.strokes:
-            return 0
-        last = fr.drawing.strokes[-1]
-        return len(last.points)
-    except Exception:
-        return 0
+    drawing = get_frame_drawing(context, frame_number)
+    if drawing is None: return 0
+    strokes = drawing.strokes
+    if not strokes: return 0
+    return len(strokes[-1].points)
+
+def project_to_region(pts, persp, width, height):
+    """Vectorized location_3d_to_region_2d for an (N,3) array; points behind the view are dropped."""
+    clip = pts @ persp[:, :3].T + persp[:, 3]
+    clip = clip[clip[:, 3] > 0.0]
+    half = np.array((width/2.0, height/2.0), dtype='f4')
+    return half + half * (clip[:, :2] / clip[:, 3:4])
 
 # -------------------------
 # Drawing primitives (2D)
 # -------------------------
-def draw_point(pos, color):
-    _SHADER.bind()
-    _SHADER.uniform_float("color", tuple(color))
-    batch = batch_for_shader(_SHADER, "POINTS", {"pos": [pos]})
+# the vertex format is built once; batches only allocate their buffers
+def make_pos_format():
+    fmt = gpu.types.GPUVertFormat()
+    fmt.attr_add(id="pos", comp_type="F32", len=2, fetch_mode="FLOAT")
+    return fmt
+
+_POS_F32_FORMAT = make_pos_format()
+
+def make_batch(prim, pos, indices=None):
+    """GPUBatch of prim over a float32 (N,2) pos buffer, optionally indexed."""
+    vbo = gpu.types.GPUVertBuf(_POS_F32_FORMAT, len(pos))
+    vbo.attr_fill("pos", pos)
+    if indices is None:
+        # GPUBatch only accepts a GPUIndexBuf for elem, never None
+        return gpu.types.GPUBatch(type=prim, buf=vbo)
+    ibo = gpu.types.GPUIndexBuf(type=prim, seq=indices)
+    return gpu.types.GPUBatch(type=prim, buf=vbo, elem=ibo)
+
+# positions are handed over as contiguous float32 (N,2) buffers, not lists of tuples
+def as_f32(pts):
+    return np.ascontiguousarray(pts, dtype='f4')
+
+def points_batch(pts):
+    return make_batch("POINTS", as_f32(pts))
+
+def line_strip_batch(pts):
+    return make_batch("LINE_STRIP", as_f32(pts))
+
+def tris_batch(tris, indices=None):
+    # indices: optional (T,3) int32 triangle list into tris, for shapes that share corners
+    return make_batch("TRIS", as_f32(tris), indices)
+
+def draw_batch(batch, color):
+    # _SHADER must already be bound (once per draw_guides); color must be a 4-tuple
+    _SHADER.uniform_float("color", color)
     batch.draw(_SHADER)
 
-def draw_line_strip(pts, color, lw=2.0):
-    _SHADER.bind()
-    _SHADER.uniform_float("color", tuple(color))
-    try: gpu.state.line_width_set(lw)
-    except Exception: pass
-    batch = batch_for_shader(_SHADER, "LINE_STRIP", {"pos": pts})
-    batch.draw(_SHADER)
+# shapes
+def circle_fan_template(segments=12):
+    a = np.linspace(0.0, 2*math.pi, segments+1)
+    ring = np.stack((np.cos(a), np.sin(a)), axis=1)
+    tris = np.zeros((segments, 3, 2), dtype='f4')
+    tris[:, 1] = ring[:-1]
+    tris[:, 2] = ring[1:]
+    return tris.reshape(-1, 2)
+
+# unit marker shapes (size=1), only scaled and translated per marker
+_MARKER_TEMPLATES = {
+    'SQUARE': np.array([(-.5,-.5),(.5,-.5),(.5,.5), (-.5,-.5),(.5,.5),(-.5,.5)], dtype='f4'),
+    'TRIANGLE': np.array([(0.0,.43),(-.43,-.43),(.43,-.43)], dtype='f4'),
+    'CIRCLE': circle_fan_template(segments=14) / 1.5,
+}
 
-def draw_lines_flat(pairs, color, lw=2.0):
-    _SHADER.bind()
-    _SHADER.uniform_float("color", tuple(color))
-    try: gpu.state.line_width_set(lw)
-    except Exception: pass
-    batch = batch_for_shader(_SHADER, "LINES", {"pos": pairs})
-    batch.draw(_SHADER)
+def marker_tris(center, shape, size):
+    template = _MARKER_TEMPLATES.get(shape, _MARKER_TEMPLATES['CIRCLE'])
+    return template * size + center
+
+# arrow primitives (mid, d, perp are (n,2) arrays, d of unit length)
+# vertices are written straight into the (n,k,2) result, shared terms computed once
+def make_arrow_tri(mid, d, perp, size, out=None):
+    s3 = size*0.33
+    if out is None:
+        out = np.empty((len(mid), 3, 2), dtype='f4')
+    back = mid - d*s3
+    side = perp*s3
+    np.add(mid, d*size, out=out[:, 0])       # tip
+    np.add(back, side, out=out[:, 1])        # bl
+    np.subtract(back, side, out=out[:, 2])   # br
+    return out
+
+def make_rect(mid, d, perp, size, width_factor=0.35, out=None):
+    # 4 unique corners, drawn as two triangles through _RECT_INDICES
+    if out is None:
+        out = np.empty((len(mid), 4, 2), dtype='f4')
+    half_len = d*(size*0.6)
+    half_w = perp*(size*width_factor)
+    back = mid - half_len
+    front = mid + half_len
+    np.add(back, half_w, out=out[:, 0])        # a
+    np.add(front, half_w, out=out[:, 1])       # b
+    np.subtract(front, half_w, out=out[:, 2])  # c
+    np.subtract(back, half_w, out=out[:, 3])   # dpt
+    return out
+
+# per-arrow triangle indices into its own vertices
+_RECT_INDICES = np.array([(0,1,2), (0,2,3)], dtype='i4')
+_RECT_TRI_INDICES = np.array([(0,1,2), (0,2,3), (4,5,6)], dtype='i4')
+
+def shape_indices(pattern, count, verts_per_shape):
+    """Repeat a per-shape (T,3) index pattern for count shapes laid out back to back."""
+    base = np.arange(count, dtype='i4')[:, None, None] * verts_per_shape
+    return (pattern[None] + base).reshape(-1, 3)
+
+def arrow_indices(seg_count, density, margin_pct):
+    """Return the (read-only) segment indices that get an arrow, cached per (seg_count, density, margin)."""
+    key = (seg_count, density, margin_pct)
+    i = _arrow_index_cache.pop(key, None)
+    if i is None:
+        # arrows/ticks - compute segments to place arrows skipping margin
+        margin_steps = int(math.ceil(seg_count * (margin_pct/100.0)))
+        margin_steps = max(0, min(margin_steps, seg_count//2))
 
-def draw_tris_flat(tris, color):
-    _SHADER.bind()
-    _SHADER.uniform_float("color", tuple(color))
-    batch = batch_for_shader(_SHADER, "TRIS", {"pos": tris})
-    batch.draw(_SHADER)
+        step = max(1, int(seg_count / max(1, density)))
 
-# shapes
-def square_around(center, size):
-    x,y = center
-    hs = size/2.0
-    return [(x-hs,y-hs),(x+hs,y-hs),(x+hs,y+hs),(x-hs,y+hs)]
-
-def triangle_around(center, size):
-    x,y = center
-    h = size*0.86
-    return [(x,y+h/2.0),(x-h/2.0,y-h/2.0),(x+h/2.0,y-h/2.0)]
-
-def circle_fan(center, size, segments=12):
-    x,y = center
-    pts = []
-    for i in range(segments):
-        a0 = 2*math.pi*(i/segments)
-        a1 = 2*math.pi*((i+1)/segments)
-        pts.extend([(x,y),(x+math.cos(a0)*size,y+math.sin(a0)*size),(x+math.cos(a1)*size,y+math.sin(a1)*size)])
-    return pts
-
-def draw_marker_shape(center, shape, size, color):
-    if shape == 'SQUARE':
-        poly = square_around(center, size)
-        tris = [poly[0],poly[1],poly[2], poly[0],poly[2],poly[3]]
-        draw_tris_flat(tris, color)
-    elif shape == 'TRIANGLE':
-        tri = triangle_around(center, size)
-        tris = [tri[0],tri[1],tri[2]]
-        draw_tris_flat(tris, color)
+        i = np.arange(margin_steps, seg_count - margin_steps, step, dtype='i4')
+        i.flags.writeable = False
+        if len(_arrow_index_cache) >= _ARROW_INDEX_CACHE_SIZE:
+            # evict the least recently used entry
+            del _arrow_index_cache[next(iter(_arrow_index_cache))]
+    _arrow_index_cache[key] = i
+    return i
+
+def arrow_tris(pts2d, arrow_shape, density, arrow_size, margin_pct):
+    """Return (verts, indices) for the arrows along a projected stroke: (M,2) float32 vertices
+    and an (T,3) int32 triangle list, or None when verts are already plain triangles."""
+    i = arrow_indices(len(pts2d)-1, density, margin_pct)
+    a = pts2d[i]; b = pts2d[i+1]; seg = b - a
+    lens = np.linalg.norm(seg, axis=1, keepdims=True)
+    keep = lens[:, 0] >= 1e-6
+    a = a[keep]; b = b[keep]; seg = seg[keep]
+    d = seg / lens[keep]
+    perp = np.stack((-d[:, 1], d[:, 0]), axis=1)
+    mid = (a + b) * 0.5
+
+    n = len(mid)
+    if arrow_shape == 'TRI':
+        return make_arrow_tri(mid, d, perp, arrow_size).reshape(-1, 2), None
+    elif arrow_shape == 'RECT':
+        verts = make_rect(mid, d, perp, arrow_size, width_factor=0.28)
+        indices = shape_indices(_RECT_INDICES, n, 4)
+    elif arrow_shape == 'DOTTED':
+        verts = make_rect(mid, d, perp, arrow_size*0.6, width_factor=0.25)
+        indices = shape_indices(_RECT_INDICES, n, 4)
+    elif arrow_shape == 'RECT_TRI':
+        # shaft rect + tip tri: 7 verts per arrow written into one buffer
+        verts = np.empty((n, 7, 2), dtype='f4')
+        make_rect(mid - d*(arrow_size*0.25), d, perp, arrow_size*0.9, width_factor=0.22, out=verts[:, :4])
+        make_arrow_tri(mid + d*(arrow_size*0.5), d, perp, arrow_size*0.9, out=verts[:, 4:])
+        indices = shape_indices(_RECT_TRI_INDICES, n, 7)
     else:
-        tris = circle_fan(center, size/1.5, segments=14)
-        draw_tris_flat(tris, color)
-
-# arrow primitives
-def make_arrow_tri(mid, direction, size):
-    d = direction.normalized()
-    perp = Vector((-d.y, d.x))
-    tip = (mid + d*size).to_tuple()
-    bl = (mid - d*(size*0.33) + perp*(size*0.33)).to_tuple()
-    br = (mid - d*(size*0.33) - perp*(size*0.33)).to_tuple()
-    return [tip, bl, br]
-
-def make_rect(mid, direction, size, width_factor=0.35):
-    d = direction.normalized()
-    perp = Vector((-d.y, d.x))
-    half_len = size*0.6
-    half_w = size*width_factor
-    a = (mid - d*half_len + perp*half_w).to_tuple()
-    b = (mid + d*half_len + perp*half_w).to_tuple()
-    c = (mid + d*half_len - perp*half_w).to_tuple()
-    dpt = (mid - d*half_len - perp*half_w).to_tuple()
-    return [a,b,c, a,c,dpt]
+        return np.empty((0, 2), dtype='f4'), None
+    return verts.reshape(-1, 2), indices
+
+def segment_midpoints(pts2d, density):
+    i = arrow_indices(len(pts2d)-1, density, 0)
+    return (pts2d[i] + pts2d[i+1]) * 0.5
+
+def build_guide_batches(pts2d, show_arrows, arrow_shape, density, arrow_size, margin_pct, mark_shape, mark_size):
+    """Return ((start_batch, end_batch), arrow_batch) for a projected stroke; any may be None."""
+    if not len(pts2d):
+        return (None, None), None
+
+    start = tris_batch(marker_tris(pts2d[0], mark_shape, mark_size))
+    # single-point stroke marker
+    if len(pts2d) == 1:
+        return (start, None), None
+
+    end = tris_batch(marker_tris(pts2d[-1], mark_shape, mark_size))
+
+    if show_arrows:
+        verts, indices = arrow_tris(pts2d, arrow_shape, density, arrow_size, margin_pct)
+        # kept float32: whole-pixel (int16) vertices collapse small shapes, e.g. DOTTED at size 2
+        arrows = tris_batch(verts, indices) if len(verts) else None
+    else:
+        mids = segment_midpoints(pts2d, density)
+        arrows = points_batch(mids) if len(mids) else None
+    return (start, end), arrows
+
+def invalidate_draw_cache():
+    _draw_cache.clear()
 
 # -------------------------
 # Draw handler (main)
 # -------------------------
 def draw_guides():
+    if not guide_stroke_count(): return
+    context = bpy.context
+    region = context.region
+    rv3d = context.region_data
+    if region is None or rv3d is None: return
+
+    scene = context.scene
+    # colors snapshot as plain tuples once per redraw
+    start_col = tuple(scene.gi_start_color)
+    end_col = tuple(scene.gi_end_color)
+    show_arrows = scene.gi_show_arrows
+    arrow_col = tuple(scene.gi_arrow_color)
+    arrow_shape = scene.gi_arrow_shape
+    density = scene.gi_arrow_density
+    arrow_size = scene.gi_arrow_size
+    margin_pct = scene.gi_arrow_margin
+    mark_shape = scene.gi_marker_shape
+    mark_size = scene.gi_marker_size
+
+    idx = max(0, min(_guide_index, guide_stroke_count()-1))
     try:
-        if not _guide_strokes_world: return
-        context = bpy.context
-        region = context.region
-        rv3d = getattr(context,"region_data",None)
-        if region is None or rv3d is None: return
-
-        scene = context.scene
-        start_col = getattr(scene,"gi_start_color",(0.2,1.0,0.2,1.0))
-        end_col = getattr(scene,"gi_end_color",(1.0,0.2,0.2,1.0))
-        show_arrows = getattr(scene,"gi_show_arrows",True)
-        arrow_col = getattr(scene,"gi_arrow_color",(1.0,0.9,0.2,1.0))
-        arrow_shape = getattr(scene,"gi_arrow_shape","TRI")
-        density = getattr(scene,"gi_arrow_density",12)
-        arrow_size = getattr(scene,"gi_arrow_size",12.0)
-        margin_pct = getattr(scene,"gi_arrow_margin",12)
-        mark_shape = getattr(scene,"gi_marker_shape","SQUARE")
-        mark_size = getattr(scene,"gi_marker_size",8)
-
-        idx = max(0, min(_guide_index, len(_guide_strokes_world)-1))
-        stroke_world = _guide_strokes_world[idx]
-
-        pts2d = []
-        for w in stroke_world:
-            p2 = view3d_utils.location_3d_to_region_2d(region, rv3d, w)
-            if p2 is not None:
-                pts2d.append((p2.x, p2.y))
-        if not pts2d: return
-
+        persp = np.asarray(rv3d.perspective_matrix, dtype='f4')
+
+        # every 3D view region gets its own entry, so several viewports don't evict each other
+        region_id = region.as_pointer()
+        cached = _draw_cache.get(region_id)
+        if cached is None:
+            cached = _draw_cache[region_id] = new_draw_cache_entry()
+
+        # the projection and path only depend on the view, the frame and the active stroke;
+        # redraws with the same signature (selection, cursor, ...) reuse the cached batches
+        view_key = (persp.tobytes(), region.width, region.height, scene.frame_current, idx)
+        view_changed = cached["view_key"] != view_key
+        if view_changed:
+            stroke = _guide_points_xyz[_guide_stroke_offsets[idx]:_guide_stroke_offsets[idx+1]]
+            pts2d = project_to_region(stroke, persp, region.width, region.height)
+            cached["pts2d"] = pts2d
+            cached["path_batch"] = line_strip_batch(pts2d) if len(pts2d) > 1 else None
+            cached["view_key"] = view_key
+
+        # markers/arrows also depend on the guide settings, colors are uniforms
+        key = (show_arrows, arrow_shape, density, arrow_size, margin_pct, mark_shape, mark_size)
+        if view_changed or cached["key"] != key:
+            cached["marker_batch"], cached["arrow_batch"] = build_guide_batches(
+                cached["pts2d"], show_arrows, arrow_shape, density, arrow_size, margin_pct, mark_shape, mark_size)
+            cached["key"] = key
+
+        path_batch = cached["path_batch"]
+        start_batch, end_batch = cached["marker_batch"]
+        arrow_batch = cached["arrow_batch"]
+        if start_batch is None: return
+
+        # all GPU state for the overlay is set once, before any draw
+        _SHADER.bind()
         gpu.state.blend_set("ALPHA")
         try: gpu.state.point_size_set(6)
         except Exception: pass
-
-        # single-point stroke marker
-        if len(pts2d) == 1:
-            draw_marker_shape(pts2d[0], mark_shape, mark_size, start_col)
-            gpu.state.blend_set("NONE")
-            return
+        try: gpu.state.line_width_set(2.0)
+        except Exception: pass
 
         # stroke path
-        draw_line_strip(pts2d, (0.28,0.68,1.0,0.32), lw=2.0)
+        if path_batch is not None:
+            draw_batch(path_batch, (0.28,0.68,1.0,0.32))
 
         # start/end markers
-        draw_marker_shape(pts2d[0], mark_shape, mark_size, start_col)
-        draw_marker_shape(pts2d[-1], mark_shape, mark_size, end_col)
-
-        # arrows/ticks - compute segments to place arrows skipping margin
-        seg_count = len(pts2d)-1
-        margin_steps = int(math.ceil(seg_count * (margin_pct/100.0)))
-        margin_steps = max(0, min(margin_steps, seg_count//2))
-
-        step = max(1, int(seg_count / max(1, density)))
+        draw_batch(start_batch, start_col)
+        if end_batch is not None:
+            draw_batch(end_batch, end_col)
 
-        if show_arrows:
-            tris = []
-            for i in range(margin_steps, seg_count - margin_steps, step):
-                a = Vector(pts2d[i]); b = Vector(pts2d[i+1]); seg = b - a
-                if seg.length < 1e-6: continue
-                mid = (a + b) / 2.0
-                if arrow_shape == 'TRI':
-                    tri = make_arrow_tri(mid, seg, arrow_size)
-                    tris.extend(tri)
-                elif arrow_shape == 'RECT':
-                    rect = make_rect(mid, seg, arrow_size, width_factor=0.28)
-                    tris.extend(rect)
-                elif arrow_shape == 'DOTTED':
-                    rect = make_rect(mid, seg, arrow_size*0.6, width_factor=0.25)
-                    tris.extend(rect)
-                elif arrow_shape == 'RECT_TRI':
-                    center = mid - seg.normalized()*(arrow_size*0.25)
-                    rect = make_rect(center, seg, arrow_size*0.9, width_factor=0.22)
-                    tris.extend(rect)
-                    tri = make_arrow_tri(mid + seg.normalized()*(arrow_size*0.5), seg, arrow_size*0.9)
-                    tris.extend(tri)
-            if tris:
-                draw_tris_flat(tris, arrow_col)
-        else:
-            mids = []
-            for i in range(0, seg_count, step):
-                a = Vector(pts2d[i]); b = Vector(pts2d[i+1])
-                mids.append(((a+b)/2.0).to_tuple())
-            if mids:
-                draw_point(mids[0], (1.0,1.0,0.0,0.88))
-                _SHADER.uniform_float("color", (1.0,1.0,0.0,0.88))
-                batch = batch_for_shader(_SHADER, "POINTS", {"pos": mids})
-                batch.draw(_SHADER)
+        if arrow_batch is not None:
+            draw_batch(arrow_batch, arrow_col if show_arrows else (1.0,1.0,0.0,0.88))
 
         gpu.state.blend_set("NONE")
 
@@ -370,8 +486,9 @@ def draw_guides():
 # Timer / watcher (debounce + last-stroke-pointlen check)
 # -------------------------
 def _watch_timer():
-    global _last_current_frame_count, _guide_index, _timer_keep, _draw_handle
+    global _last_current_frame_count, _guide_index, _timer_keep, _draw_handle, _guide_points_xyz, _guide_stroke_offsets
     global _monitored_frame, _pending_active, _pending_target, _pending_time, _pending_last_pointlen, _advances_since_check
+    global _dirty
 
     if not _timer_keep:
         return None
@@ -379,99 +496,159 @@ def _watch_timer():
         _timer_keep = False
         return None
 
+    woken = _dirty
+    _dirty = False
+
+    # read everything the tick needs from bpy up front; the state logic below stays bpy-free
     try:
         context = bpy.context
         scene = context.scene
-        current_frame = context.scene.frame_current
+        current_frame = scene.frame_current
         current_count = get_frame_stroke_count(context, current_frame)
+        lock_frame = scene.gi_lock_frame
+        advance_on_release = scene.gi_advance_on_release
+        integrity_check = scene.gi_integrity_check
+        # only used while a commit is pending or about to start, on the monitored (= current) frame
+        cur_len = 0
+        if _pending_active or current_count > _last_current_frame_count:
+            cur_len = get_last_stroke_pointlen(context, current_frame)
+    except Exception:
+        debug("Exception in _watch_timer:\n"+traceback.format_exc())
+        return _IDLE_INTERVAL
 
-        # FRAME CHANGE HANDLING
-        if _monitored_frame is None or current_frame != _monitored_frame:
-            if getattr(scene,"gi_lock_frame", False) and _monitored_frame is not None:
-                _last_current_frame_count = current_count
-                _pending_active = False
+    redraw_needed = False
+    recheck_needed = False
+
+    # FRAME CHANGE HANDLING
+    if _monitored_frame is None or current_frame != _monitored_frame:
+        if lock_frame and _monitored_frame is not None:
+            _last_current_frame_count = current_count
+            _pending_active = False
+        else:
+            _monitored_frame = current_frame
+            _last_current_frame_count = current_count
+            if guide_stroke_count():
+                _guide_index = min(_last_current_frame_count, max(0, guide_stroke_count()-1))
             else:
-                _monitored_frame = current_frame
-                _last_current_frame_count = current_count
-                if _guide_strokes_world:
-                    _guide_index = min(_last_current_frame_count, max(0, len(_guide_strokes_world)-1))
+                _guide_index = 0
+            _pending_active = False
+            redraw_needed = True
+
+    else:
+        # If a pending commit is active: check stability (both stroke count and last stroke pointlen)
+        if _pending_active:
+            # if count changed, update target and reset timer & last_pointlen
+            if current_count != _pending_target:
+                _pending_target = current_count
+                _pending_last_pointlen = cur_len
+                _pending_time = time.time()
+            else:
+                # check last stroke pointlen
+                now = time.time()
+                if cur_len != _pending_last_pointlen:
+                    # still growing — update and reset timer
+                    _pending_last_pointlen = cur_len
+                    _pending_time = now
                 else:
-                    _guide_index = 0
-                _pending_active = False
-                for w in bpy.context.window_manager.windows:
-                    for a in w.screen.areas:
-                        if a.type == "VIEW_3D": a.tag_redraw()
+                    # stable: check debounce
+                    if (now - _pending_time) >= _debounce_seconds:
+                        added = _pending_target - _last_current_frame_count
+                        if added > 0:
+                            _guide_index = min(_guide_index + added, max(0, guide_stroke_count()-1))
+                            _last_current_frame_count = _pending_target
+                            _advances_since_check += added
+                            if _advances_since_check >= integrity_check:
+                                _advances_since_check = 0
+                                recheck_needed = True
+                            redraw_needed = True
+                        _pending_active = False
 
         else:
-            # If a pending commit is active: check stability (both stroke count and last stroke pointlen)
-            if _pending_active:
-                # if count changed, update target and reset timer & last_pointlen
-                if current_count != _pending_target:
+            # No pending active: normal detection
+            if current_count > _last_current_frame_count:
+                added = current_count - _last_current_frame_count
+                if advance_on_release:
+                    # start pending and record target/time and last stroke pointlen
+                    _pending_active = True
                     _pending_target = current_count
-                    _pending_last_pointlen = get_last_stroke_pointlen(context, _monitored_frame)
                     _pending_time = time.time()
+                    _pending_last_pointlen = cur_len
                 else:
-                    # check last stroke pointlen
-                    cur_len = get_last_stroke_pointlen(context, _monitored_frame)
-                    now = time.time()
-                    if cur_len != _pending_last_pointlen:
-                        # still growing — update and reset timer
-                        _pending_last_pointlen = cur_len
-                        _pending_time = now
-                    else:
-                        # stable: check debounce
-                        if (now - _pending_time) >= _debounce_seconds:
-                            added = _pending_target - _last_current_frame_count
-                            if added > 0:
-                                _guide_index = min(_guide_index + added, max(0, len(_guide_strokes_world)-1))
-                                _last_current_frame_count = _pending_target
-                                _advances_since_check += added
-                                if _advances_since_check >= getattr(scene, "gi_integrity_check", 3):
-                                    _advances_since_check = 0
-                                    _guide_strokes_world[:] = get_previous_frame_strokes_world(context)
-                                for w in bpy.context.window_manager.windows:
-                                    for a in w.screen.areas:
-                                        if a.type == "VIEW_3D": a.tag_redraw()
-                            _pending_active = False
-
-            else:
-                # No pending active: normal detection
-                if current_count > _last_current_frame_count:
-                    added = current_count - _last_current_frame_count
-                    if getattr(scene, "gi_advance_on_release", False):
-                        # start pending and record target/time and last stroke pointlen
-                        _pending_active = True
-                        _pending_target = current_count
-                        _pending_time = time.time()
-                        _pending_last_pointlen = get_last_stroke_pointlen(context, _monitored_frame)
-                    else:
-                        # immediate advance
-                        _guide_index = min(_guide_index + added, max(0, len(_guide_strokes_world)-1))
-                        _last_current_frame_count = current_count
-                        _advances_since_check += added
-                        if _advances_since_check >= getattr(scene, "gi_integrity_check", 3):
-                            _advances_since_check = 0
-                            _guide_strokes_world[:] = get_previous_frame_strokes_world(context)
-                        for w in bpy.context.window_manager.windows:
-                            for a in w.screen.areas:
-                                if a.type == "VIEW_3D": a.tag_redraw()
-
-                elif current_count < _last_current_frame_count:
-                    # stroke removal
+                    # immediate advance
+                    _guide_index = min(_guide_index + added, max(0, guide_stroke_count()-1))
                     _last_current_frame_count = current_count
-                    _pending_active = False
-                    if _guide_strokes_world:
-                        _guide_index = min(current_count, max(0, len(_guide_strokes_world)-1))
-                    else:
-                        _guide_index = 0
-                    for w in bpy.context.window_manager.windows:
-                        for a in w.screen.areas:
-                            if a.type == "VIEW_3D": a.tag_redraw()
+                    _advances_since_check += added
+                    if _advances_since_check >= integrity_check:
+                        _advances_since_check = 0
+                        recheck_needed = True
+                    redraw_needed = True
+
+            elif current_count < _last_current_frame_count:
+                # stroke removal
+                _last_current_frame_count = current_count
+                _pending_active = False
+                if guide_stroke_count():
+                    _guide_index = min(current_count, max(0, guide_stroke_count()-1))
+                else:
+                    _guide_index = 0
+                redraw_needed = True
 
-    except Exception:
-        debug("Exception in _watch_timer:\n"+traceback.format_exc())
+    if recheck_needed or redraw_needed:
+        try:
+            if recheck_needed:
+                invalidate_frame_index()
+                _guide_points_xyz, _guide_stroke_offsets = get_previous_frame_strokes_world(context)
+            invalidate_draw_cache()
+            tag_view3d_redraw()
+        except Exception:
+            debug("Exception in _watch_timer:\n"+traceback.format_exc())
+
+    return _ACTIVE_INTERVAL if (woken or _pending_active) else _IDLE_INTERVAL
+
+def _wake_watcher():
+    # pull a slow idle tick forward
+    if bpy.app.timers.is_registered(_watch_timer):
+        bpy.app.timers.unregister(_watch_timer)
+    bpy.app.timers.register(_watch_timer, first_interval=_ACTIVE_INTERVAL)
+
+def _on_dg_update(scene, depsgraph):
+    global _dirty
+    if not _timer_keep:
+        return
+    for id_type in _GP_ID_TYPES:
+        try:
+            updated = depsgraph.id_type_updated(id_type)
+        except TypeError:
+            # id type name not known to this Blender build
+            continue
+        if updated:
+            # frames may have been moved (same count), so the cached frame refs can be stale
+            invalidate_frame_index()
+            if not _dirty:
+                _dirty = True
+                _wake_watcher()
+            return
 
-    return 0.12
+def _on_frame_change(scene, depsgraph=None):
+    global _dirty
+    if _dirty or not _timer_keep:
+        return
+    _dirty = True
+    _wake_watcher()
+
+def add_update_handlers():
+    handlers = bpy.app.handlers
+    if _on_dg_update not in handlers.depsgraph_update_post:
+        handlers.depsgraph_update_post.append(_on_dg_update)
+    if _on_frame_change not in handlers.frame_change_post:
+        handlers.frame_change_post.append(_on_frame_change)
+
+def remove_update_handlers():
+    handlers = bpy.app.handlers
+    if _on_dg_update in handlers.depsgraph_update_post:
+        handlers.depsgraph_update_post.remove(_on_dg_update)
+    if _on_frame_change in handlers.frame_change_post:
+        handlers.frame_change_post.remove(_on_frame_change)
 
 # -------------------------
 # Operators
@@ -481,19 +658,20 @@ class GP_OT_GuideStart(bpy.types.Operator):
     bl_label = "Start Guides"
 
     def execute(self, context):
-        global _draw_handle, _guide_strokes_world, _guide_index, _last_current_frame_count, _timer_keep, _monitored_frame, _pending_active, _advances_since_check
+        global _draw_handle, _guide_points_xyz, _guide_stroke_offsets, _guide_index, _last_current_frame_count, _timer_keep, _monitored_frame, _pending_active, _advances_since_check
         obj = get_active_gp(context)
         if not obj:
             self.report({"WARNING"},"Select a Grease Pencil object first")
             return {"CANCELLED"}
-        strokes = get_previous_frame_strokes_world(context)
-        if not strokes:
+        invalidate_frame_index()
+        points, offsets = get_previous_frame_strokes_world(context)
+        if len(offsets) < 2:
             self.report({"WARNING"},"No strokes found in previous frame")
             return {"CANCELLED"}
-        _guide_strokes_world = strokes
+        _guide_points_xyz, _guide_stroke_offsets = points, offsets
         _monitored_frame = context.scene.frame_current
         _last_current_frame_count = get_frame_stroke_count(context, _monitored_frame)
-        _guide_index = min(_last_current_frame_count, max(0, len(_guide_strokes_world)-1))
+        _guide_index = min(_last_current_frame_count, max(0, guide_stroke_count()-1))
         _pending_active = False
         _advances_since_check = 0
         if _draw_handle is None:
@@ -505,18 +683,19 @@ class GP_OT_GuideStart(bpy.types.Operator):
                 _draw_handle = None
                 return {"CANCELLED"}
         _timer_keep = True
-        bpy.app.timers.register(_watch_timer)
-        for w in bpy.context.window_manager.windows:
-            for a in w.screen.areas:
-                if a.type == "VIEW_3D": a.tag_redraw()
-        self.report({"INFO"}, f"Guides started — {len(_guide_strokes_world)} hints loaded; monitoring frame {_monitored_frame}")
+        add_update_handlers()
+        if not bpy.app.timers.is_registered(_watch_timer):
+            bpy.app.timers.register(_watch_timer)
+        invalidate_draw_cache()
+        tag_view3d_redraw()
+        self.report({"INFO"}, f"Guides started — {guide_stroke_count()} hints loaded; monitoring frame {_monitored_frame}")
         return {"FINISHED"}
 
 class GP_OT_GuideStop(bpy.types.Operator):
     bl_idname = "gp_guide.stop"
     bl_label = "Stop Guides"
     def execute(self, context):
-        global _draw_handle, _guide_strokes_world, _timer_keep, _monitored_frame, _pending_active
+        global _draw_handle, _guide_points_xyz, _guide_stroke_offsets, _timer_keep, _monitored_frame, _pending_active
         if _draw_handle is not None:
             try:
                 bpy.types.SpaceView3D.draw_handler_remove(_draw_handle,"WINDOW")
@@ -524,12 +703,13 @@ class GP_OT_GuideStop(bpy.types.Operator):
                 debug("handler remove failed:\n"+traceback.format_exc())
             _draw_handle = None
         _timer_keep = False
-        _guide_strokes_world = []
+        remove_update_handlers()
+        _guide_points_xyz, _guide_stroke_offsets = _no_strokes()
         _monitored_frame = None
         _pending_active = False
-        for w in bpy.context.window_manager.windows:
-            for a in w.screen.areas:
-                if a.type == "VIEW_3D": a.tag_redraw()
+        invalidate_frame_index()
+        invalidate_draw_cache()
+        tag_view3d_redraw()
         self.report({"INFO"},"Guides stopped")
         return {"FINISHED"}
 
@@ -594,6 +774,7 @@ def unregister():
         except Exception: pass
         _draw_handle = None
     _timer_keep = False
+    remove_update_handlers()
     for c in reversed(classes):
         try: bpy.utils.unregister_class(c)
         except Exception: pass